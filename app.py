@@ -2,8 +2,77 @@ import streamlit as st
 import requests
 import streamlit.components.v1 as components
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import re
+import json
+import asyncio
+import warnings
+
+try:
+    import aiohttp
+except ImportError:  # optional: PDBs are then fetched on demand only
+    aiohttp = None
+
+try:
+    from numba import njit
+except ImportError:  # optional: risk scores then use the NumPy path
+    njit = None
+
+try:
+    import numexpr as ne
+except ImportError:  # optional: the NumPy path then evaluates the risk sum
+    ne = None
+
+# Weights of the aggregation risk model, shared by the Numba kernel, the
+# NumExpr expression and the NumPy path so the three cannot drift apart
+HYDRO_WEIGHT = 10       # per unit of positive hydrophobicity
+BETA_WEIGHT = 15        # per unit of beta-sheet propensity
+CLUSTER_WEIGHT = 8      # per unit of positive local hydrophobicity
+CHARGE_CAP = 3          # charge clustering below this increases risk...
+CHARGE_WEIGHT = 5       # ...by this much per unit
+MOTIF_WEIGHT = 25       # per unit of motif proximity score
+MAX_RISK = 100          # scores are clipped to 0..MAX_RISK
+
+def build_risk_kernel():
+    """Compile the per-residue risk kernel with Numba (None if unavailable)."""
+    if njit is None:
+        return None
+    
+    @njit(fastmath=True)
+    def risk_kernel(idx, hydro_lut, charge_lut, beta_lut, motif_centers):
+        n = idx.shape[0]
+        out = np.empty(n, np.float32)
+        for i in range(n):
+            # Sliding window (size 5, truncated at the termini)
+            lo = max(0, i - 2)
+            hi = min(n, i + 3)
+            window_hydro = 0.0
+            window_charge = 0.0
+            for j in range(lo, hi):
+                window_hydro += hydro_lut[idx[j]]
+                window_charge += abs(charge_lut[idx[j]])
+            local_hydro = window_hydro / (hi - lo)
+            
+            # Proximity to known motifs, decaying with distance
+            motif_score = 0.0
+            for center in motif_centers:
+                distance = abs(i - center)
+                if distance < 5:
+                    motif_score += (5 - distance) / 5
+            
+            total = (max(0.0, hydro_lut[idx[i]]) * HYDRO_WEIGHT
+                     + beta_lut[idx[i]] * BETA_WEIGHT
+                     + max(0.0, local_hydro) * CLUSTER_WEIGHT
+                     + max(0.0, CHARGE_CAP - window_charge) * CHARGE_WEIGHT
+                     + motif_score * MOTIF_WEIGHT)
+            out[i] = min(MAX_RISK, max(0.0, total))
+        return out
+    
+    # Compile now (with the argument types used at runtime) so the first
+    # user interaction does not pay for it
+    lut = np.zeros(128, dtype=np.float32)
+    risk_kernel(np.frombuffer(b'A', dtype=np.uint8), lut, lut, lut, np.zeros(0, dtype=np.int64))
+    return risk_kernel
 
 # Your AggregationPredictor class
 class AggregationPredictor:
@@ -35,6 +104,12 @@ class AggregationPredictor:
             'S': 0.75, 'T': 1.19, 'W': 1.37, 'Y': 1.47, 'V': 1.70
         }
         
+        # Lookup tables indexed by ASCII code, built once; the dicts above stay
+        # the readable source of truth and the hot paths only use these arrays
+        self._hydro_lut = self._build_lut(self.hydrophobicity)
+        self._charge_lut = self._build_lut(self.charge)
+        self._beta_lut = self._build_lut(self.beta_propensity)
+        
         # Known aggregation-prone motifs in α-synuclein
         self.aggregation_motifs = [
             'NAC',      # Non-amyloid component region
@@ -44,122 +119,189 @@ class AggregationPredictor:
             'GAVVT',    # Another aggregation-prone sequence
         ]
         
+        # Single-pass motif scanner: a zero-width lookahead reports overlapping
+        # matches, longest alternative first; shorter motifs that are prefixes
+        # of the matched one are recovered from _motif_prefixes.
+        motifs = sorted(set(self.aggregation_motifs), key=len, reverse=True)
+        self._motif_re = re.compile('(?=(' + '|'.join(map(re.escape, motifs)) + '))')
+        self._motif_prefixes = {
+            m: [p for p in self.aggregation_motifs if m.startswith(p)] for m in motifs
+        }
+        
         # α-synuclein sequence (human, UniProt P37840)
         self.alpha_syn_sequence = (
             "MDVFMKGLSKAKEGVVAAAEKTKQGVAEAAGKTKEGVLYVGSKTKEGVVHGVATVAEKTKEQV"
             "TNVGGAVVTGVTAVAQKTVEGAGSIAAATGFVKKDQLGKNEEGAPQEGILEDMPVDPDNEAYE"
             "MPSEEGYQDYEPEA"
         )
+        
+        # Accelerated risk paths, if Numba / NumExpr are installed; each is
+        # checked against the NumPy path and dropped if it disagrees
+        self._risk_kernel = build_risk_kernel()
+        self._use_numexpr = ne is not None
+        self._check_risk_parity(self.alpha_syn_sequence)
+    
+    @staticmethod
+    def _build_lut(table: Dict[str, float]) -> np.ndarray:
+        """Build an ASCII-indexed lookup table from an amino acid property dict."""
+        lut = np.zeros(128, dtype=np.float32)
+        for aa, value in table.items():
+            lut[ord(aa)] = value
+        return lut
+    
+    @staticmethod
+    def _encode(sequence: str) -> np.ndarray:
+        """Encode a sequence as an array of ASCII codes for table lookups."""
+        return np.frombuffer(sequence.upper().encode('ascii'), dtype=np.uint8)
     
-    def extract_features(self, sequence: str) -> Dict[str, List[float]]:
+    def _motif_centers(self, sequence: str) -> np.ndarray:
+        """Return the center position of every (overlapping) motif match."""
+        centers = []
+        for match in self._motif_re.finditer(sequence.upper()):
+            for motif in self._motif_prefixes[match.group(1)]:
+                centers.append(match.start() + len(motif)//2)
+        return np.array(centers, dtype=np.int64)
+    
+    def extract_features(self, sequence: str) -> Dict[str, np.ndarray]:
         """Extract aggregation-relevant features from protein sequence."""
-        features = {
-            'hydrophobicity': [],
-            'charge': [],
-            'beta_propensity': [],
-            'local_hydrophobicity': [],
-            'charge_clustering': [],
-            'motif_score': []
-        }
+        n = len(sequence)
         
-        sequence = sequence.upper()
+        # Encode once as byte codes and look up all properties in one pass
+        idx = self._encode(sequence)
+        hydro = self._hydro_lut[idx]
+        charge = self._charge_lut[idx]
+        beta = self._beta_lut[idx]
         
-        for i, aa in enumerate(sequence):
-            # Basic properties
-            features['hydrophobicity'].append(self.hydrophobicity.get(aa, 0))
-            features['charge'].append(self.charge.get(aa, 0))
-            features['beta_propensity'].append(self.beta_propensity.get(aa, 0))
-            
-            # Local hydrophobicity (sliding window average)
-            window = 5
-            start = max(0, i - window//2)
-            end = min(len(sequence), i + window//2 + 1)
-            local_hydro = np.mean([self.hydrophobicity.get(sequence[j], 0) 
-                                 for j in range(start, end)])
-            features['local_hydrophobicity'].append(local_hydro)
-            
-            # Charge clustering (local charge concentration)
-            local_charge = np.sum([abs(self.charge.get(sequence[j], 0)) 
-                                 for j in range(start, end)])
-            features['charge_clustering'].append(local_charge)
-            
-            # Motif score (proximity to known aggregation motifs)
-            motif_score = 0
-            for motif in self.aggregation_motifs:
-                for j in range(len(sequence) - len(motif) + 1):
-                    if sequence[j:j+len(motif)] == motif:
-                        distance = abs(i - (j + len(motif)//2))
-                        motif_score += max(0, 5 - distance) / 5  # Decay with distance
-            features['motif_score'].append(motif_score)
+        # Sliding window (size 5, truncated at the termini) as differences of
+        # prefix sums: cs[hi] - cs[lo] is the sum over positions lo..hi-1
+        positions = np.arange(n)
+        lo = np.maximum(positions - 2, 0)
+        hi = np.minimum(positions + 3, n)
+        
+        # Local hydrophobicity (sliding window average)
+        cs = np.concatenate(([0.0], np.cumsum(hydro, dtype=np.float64)))
+        local_hydro = (cs[hi] - cs[lo]) / (hi - lo)
+        
+        # Charge clustering (local charge concentration)
+        cs = np.concatenate(([0.0], np.cumsum(np.abs(charge), dtype=np.float64)))
+        charge_clustering = cs[hi] - cs[lo]
         
-        return features
+        # Motif score (proximity to known aggregation motifs)
+        motif_score = np.zeros(n, dtype=np.float32)
+        for center in self._motif_centers(sequence):
+            lo = max(0, center - 5)
+            hi = min(n, center + 6)
+            distance = np.abs(np.arange(lo, hi) - center)
+            motif_score[lo:hi] += np.maximum(0, 5 - distance) / 5  # Decay with distance
+        
+        return {
+            'hydrophobicity': hydro,
+            'charge': charge,
+            'beta_propensity': beta,
+            'local_hydrophobicity': local_hydro,
+            'charge_clustering': charge_clustering,
+            'motif_score': motif_score
+        }
     
-    def calculate_aggregation_risk(self, sequence: str) -> List[float]:
+    def calculate_aggregation_risk(self, sequence: str) -> np.ndarray:
         """Calculate aggregation risk score for each position (0-100)."""
+        if self._risk_kernel is not None:
+            return self._kernel_risk(sequence)
+        
         features = self.extract_features(sequence)
-        risk_scores = []
+        if self._use_numexpr:
+            return self._numexpr_risk(features)
+        return self._numpy_risk(features)
+    
+    def _kernel_risk(self, sequence: str) -> np.ndarray:
+        """Risk scores from the compiled Numba kernel."""
+        return self._risk_kernel(self._encode(sequence), self._hydro_lut,
+                                 self._charge_lut, self._beta_lut,
+                                 self._motif_centers(sequence))
+    
+    @staticmethod
+    def _numexpr_risk(features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Risk scores with the weighted sum fused into a single NumExpr pass."""
+        total_risk = ne.evaluate(
+            f"where(h > 0, h * {HYDRO_WEIGHT}, 0) + b * {BETA_WEIGHT}"
+            f" + where(lh > 0, lh * {CLUSTER_WEIGHT}, 0)"
+            f" + where({CHARGE_CAP} - cc > 0, ({CHARGE_CAP} - cc) * {CHARGE_WEIGHT}, 0)"
+            f" + m * {MOTIF_WEIGHT}",
+            local_dict={
+                'h': features['hydrophobicity'],
+                'b': features['beta_propensity'],
+                'lh': features['local_hydrophobicity'],
+                'cc': features['charge_clustering'],
+                'm': features['motif_score'],
+            })
+        return ne.evaluate(f"where(t < 0, 0, where(t > {MAX_RISK}, {MAX_RISK}, t))",
+                           local_dict={'t': total_risk})
+    
+    @staticmethod
+    def _numpy_risk(features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Reference risk scores computed with plain NumPy."""
+        # High hydrophobicity increases risk
+        hydro_risk = np.maximum(0, features['hydrophobicity']) * HYDRO_WEIGHT
         
-        for i in range(len(sequence)):
-            # Weighted combination of features
-            risk = 0
-            
-            # High hydrophobicity increases risk
-            hydro_risk = max(0, features['hydrophobicity'][i]) * 10
-            
-            # High beta-sheet propensity increases risk
-            beta_risk = features['beta_propensity'][i] * 15
-            
-            # Local hydrophobic clusters increase risk
-            cluster_risk = max(0, features['local_hydrophobicity'][i]) * 8
-            
-            # Low charge clustering increases risk (neutral regions aggregate more)
-            charge_risk = max(0, 3 - features['charge_clustering'][i]) * 5
-            
-            # Proximity to known motifs increases risk
-            motif_risk = features['motif_score'][i] * 25
-            
-            # Combine all risk factors
-            total_risk = hydro_risk + beta_risk + cluster_risk + charge_risk + motif_risk
-            
-            # Normalize to 0-100 scale
-            risk_scores.append(min(100, max(0, total_risk)))
+        # High beta-sheet propensity increases risk
+        beta_risk = features['beta_propensity'] * BETA_WEIGHT
+        
+        # Local hydrophobic clusters increase risk
+        cluster_risk = np.maximum(0, features['local_hydrophobicity']) * CLUSTER_WEIGHT
+        
+        # Low charge clustering increases risk (neutral regions aggregate more)
+        charge_risk = np.maximum(0, CHARGE_CAP - features['charge_clustering']) * CHARGE_WEIGHT
         
-        return risk_scores
+        # Proximity to known motifs increases risk
+        motif_risk = features['motif_score'] * MOTIF_WEIGHT
+        
+        # Combine all risk factors
+        total_risk = hydro_risk + beta_risk + cluster_risk + charge_risk + motif_risk
+        
+        # Normalize to 0-100 scale
+        return np.clip(total_risk, 0, MAX_RISK)
     
-    def get_high_risk_regions(self, sequence: str, threshold: float = 60) -> List[Tuple[int, int]]:
-        """Identify continuous high-risk regions above threshold."""
-        risk_scores = self.calculate_aggregation_risk(sequence)
-        regions = []
-        start = None
+    def _check_risk_parity(self, sequence: str, atol: float = 1e-3):
+        """Disable any accelerated risk path that disagrees with the NumPy path."""
+        features = self.extract_features(sequence)
+        reference = self._numpy_risk(features)
         
-        for i, score in enumerate(risk_scores):
-            if score >= threshold and start is None:
-                start = i
-            elif score < threshold and start is not None:
-                regions.append((start, i-1))
-                start = None
+        if self._risk_kernel is not None and not np.allclose(
+                self._kernel_risk(sequence), reference, atol=atol):
+            warnings.warn("Numba risk kernel disagrees with the NumPy path; disabling it")
+            self._risk_kernel = None
+        
+        if self._use_numexpr and not np.allclose(
+                self._numexpr_risk(features), reference, atol=atol):
+            warnings.warn("NumExpr risk expression disagrees with the NumPy path; disabling it")
+            self._use_numexpr = False
+    
+    def get_high_risk_regions(self, sequence: str, threshold: float = 60,
+                              risk_scores: Optional[np.ndarray] = None) -> List[Tuple[int, int]]:
+        """Identify continuous high-risk regions above threshold."""
+        if risk_scores is None:
+            risk_scores = self.calculate_aggregation_risk(sequence)
+        risk_scores = np.asarray(risk_scores)
         
-        # Handle case where high-risk region extends to end
-        if start is not None:
-            regions.append((start, len(sequence)-1))
+        # Region boundaries are where the above-threshold mask flips
+        above = (risk_scores >= threshold).astype(np.int8)
+        edges = np.diff(above, prepend=0, append=0)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
         
-        return regions
+        return list(zip(starts.tolist(), ends.tolist()))
     
-    def get_color_map(self, risk_scores: List[float]) -> List[str]:
+    def get_color_map(self, risk_scores: np.ndarray) -> np.ndarray:
         """Convert risk scores to color map for visualization."""
-        colors = []
-        for score in risk_scores:
-            if score < 20:
-                colors.append('#00FF00')  # Green - low risk
-            elif score < 40:
-                colors.append('#80FF00')  # Yellow-green
-            elif score < 60:
-                colors.append('#FFFF00')  # Yellow
-            elif score < 80:
-                colors.append('#FF8000')  # Orange
-            else:
-                colors.append('#FF0000')  # Red - high risk
-        return colors
+        bins = np.array([20, 40, 60, 80])
+        palette = np.array([
+            '#00FF00',  # Green - low risk
+            '#80FF00',  # Yellow-green
+            '#FFFF00',  # Yellow
+            '#FF8000',  # Orange
+            '#FF0000',  # Red - high risk
+        ])
+        return palette[np.digitize(risk_scores, bins)]
 
 # Page config
 st.set_page_config(
@@ -178,6 +320,63 @@ def load_predictor():
 
 predictor = load_predictor()
 
+# Cached analysis results; the sequence is fixed, so reruns triggered by
+# widget changes reuse these instead of recomputing the features
+@st.cache_data
+def cached_risk_scores(sequence: str) -> np.ndarray:
+    return np.asarray(load_predictor().calculate_aggregation_risk(sequence))
+
+@st.cache_data
+def cached_high_risk_regions(sequence: str, threshold: float) -> List[Tuple[int, int]]:
+    return load_predictor().get_high_risk_regions(sequence, threshold,
+                                                  cached_risk_scores(sequence))
+
+@st.cache_data
+def cached_color_map(sequence: str) -> np.ndarray:
+    return load_predictor().get_color_map(cached_risk_scores(sequence))
+
+def cache_memory_stats() -> Optional[Dict[str, int]]:
+    """Memory footprint in bytes of each st.cache_data / st.cache_resource function.
+    
+    Returns None if this Streamlit version does not expose the (private)
+    cache stats providers.
+    """
+    try:
+        from streamlit.runtime.caching import (
+            get_data_cache_stats_provider,
+            get_resource_cache_stats_provider,
+        )
+    except (ImportError, AttributeError):
+        return None
+    
+    footprint = {}
+    for provider in (get_data_cache_stats_provider(), get_resource_cache_stats_provider()):
+        stats = provider.get_stats()
+        # Newer Streamlit versions group the stats by metric family
+        if isinstance(stats, dict):
+            stats = [stat for family in stats.values() for stat in family]
+        for stat in stats:
+            name = f"{stat.category_name}: {stat.cache_name}"
+            footprint[name] = footprint.get(name, 0) + stat.byte_length
+    return footprint
+
+# One pooled HTTP session per process, so cache misses reuse the connection
+@st.cache_resource
+def pdb_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({
+        'Accept-Encoding': 'gzip',
+        'User-Agent': 'alpha-syn-viewer/1.0'
+    })
+    return session
+
+# Downloaded structures are cached for a day so reruns skip the network
+@st.cache_data(ttl=24 * 3600, show_spinner=False)
+def fetch_pdb(pdb_id: str) -> str:
+    response = pdb_session().get(f"https://files.rcsb.org/download/{pdb_id}.pdb", timeout=10)
+    response.raise_for_status()
+    return response.text
+
 # Sidebar for controls
 st.sidebar.header("Structure Controls")
 
@@ -188,6 +387,32 @@ pdb_options = {
     "6CU7 - α-Synuclein in Membrane": "6CU7"
 }
 
+# Download all structures concurrently once per process
+@st.cache_resource(show_spinner=False)
+def preload_pdbs(pdb_ids: Tuple[str, ...]) -> Dict[str, str]:
+    if aiohttp is None:
+        return {}
+    
+    async def _fetch(session, pid):
+        async with session.get(f"https://files.rcsb.org/download/{pid}.pdb") as response:
+            response.raise_for_status()
+            return pid, await response.text()
+    
+    async def _fetch_all():
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            return await asyncio.gather(*[_fetch(session, pid) for pid in pdb_ids],
+                                        return_exceptions=True)
+    
+    try:
+        results = asyncio.run(_fetch_all())
+    except Exception:
+        return {}
+    # Failed downloads are skipped and fall back to fetch_pdb
+    return dict(r for r in results if not isinstance(r, BaseException))
+
+preloaded_pdbs = preload_pdbs(tuple(pdb_options.values()))
+
 selected_structure = st.sidebar.selectbox(
     "Choose α-synuclein structure:",
     options=list(pdb_options.keys())
@@ -225,22 +450,20 @@ selected_color = st.sidebar.selectbox(
 )
 color_scheme = color_options[selected_color]
 
+# Continuous rotation re-renders the scene every frame, so it is opt-in
+auto_rotate = st.sidebar.checkbox("Auto-rotate", value=False)
+
 # AI Aggregation Analysis
 st.sidebar.markdown("### 🤖 AI Aggregation Analysis")
 show_aggregation = st.sidebar.checkbox("Show aggregation risk prediction", value=True)
 
 if show_aggregation:
-    risk_threshold = st.sidebar.slider(
-        "Risk threshold for highlighting:",
-        min_value=30, max_value=90, value=60, step=10
-    )
-    
-    # Calculate aggregation risk
+    # Calculate aggregation risk once; passed down to the viewer and analysis panel
     sequence = predictor.alpha_syn_sequence
-    risk_scores = predictor.calculate_aggregation_risk(sequence)
-    high_risk_regions = predictor.get_high_risk_regions(sequence, risk_threshold)
-    avg_risk = np.mean(risk_scores)
-    max_risk = max(risk_scores)
+    risk_scores = cached_risk_scores(sequence)
+    risk_colors = cached_color_map(sequence)
+else:
+    risk_scores = risk_colors = None
 
 # Known Parkinson's mutations
 st.sidebar.markdown("### 🔴 Parkinson's Mutations")
@@ -260,114 +483,149 @@ if show_mutations:
         options=list(mutations_info.keys()),
         default=["A53T", "A30P", "E46K"]
     )
+else:
+    selected_mutations = []
 
-# Create two columns for layout
-col1, col2 = st.columns([2, 1])
+THREEDMOL_JS_URL = "https://cdnjs.cloudflare.com/ajax/libs/3Dmol/2.0.4/3Dmol-min.js"
 
-with col1:
-    st.subheader(f"Structure: {selected_structure}")
+# Function to render the 3D viewer HTML; cached per unique set of inputs.
+# Each entry embeds a whole PDB file, so the cache is bounded and expires
+# together with fetch_pdb
+@st.cache_data(max_entries=32, ttl=24 * 3600, show_spinner=False)
+def render_viewer_html(pdb_id: str, style: str, color_scheme: str,
+                       mutations: Tuple[str, ...], colors: Optional[np.ndarray],
+                       spin: bool = False) -> str:
+    # Fetch PDB data (prefetched at startup, or downloaded on demand)
+    pdb_data = preloaded_pdbs.get(pdb_id) or fetch_pdb(pdb_id)
     
-    # Function to create 3D viewer
-    def create_3d_viewer(pdb_id, style, color_scheme, mutations=None):
-        try:
-            # Fetch PDB data
-            pdb_url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
-            response = requests.get(pdb_url)
-            pdb_data = response.text
-            
-            # Create HTML with 3Dmol.js
-            mutations_list = mutations if mutations and show_mutations else []
-            
-            # Generate aggregation coloring if selected
-            aggregation_coloring = ""
-            if color_scheme == "aggregation" and show_aggregation:
-                risk_scores = predictor.calculate_aggregation_risk(predictor.alpha_syn_sequence)
-                colors = predictor.get_color_map(risk_scores)
-                for i, color in enumerate(colors):
-                    aggregation_coloring += f"viewer.addStyle({{resi: {i+1}}}, {{cartoon: {{color: '{color}'}}}});\n"
-            
-            viewer_html = f"""
-            <div id="container-01" style="height: 600px; width: 100%; position: relative;"></div>
-            
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/3Dmol/2.0.4/3Dmol-min.js"></script>
-            <script>
-            let element = document.getElementById('container-01');
-            let config = {{ backgroundColor: 'black' }};
-            let viewer = $3Dmol.createViewer(element, config);
-            
-            // PDB data
-            let pdbData = `{pdb_data}`;
-            
-            // Add model
-            viewer.addModel(pdbData, "pdb");
-            
-            // Set style based on selection
-            let styleType = "{style}";
-            let colorScheme = "{color_scheme}";
-            
-            if (colorScheme === "aggregation") {{
-                // Apply AI aggregation coloring
-                viewer.setStyle({{}}, {{{style}: {{}}}});
-                {aggregation_coloring}
-            }} else {{
-                // Apply standard coloring
-                if (styleType === "cartoon") {{
-                    viewer.setStyle({{}}, {{cartoon: {{colorscheme: colorScheme}}}});
-                }} else if (styleType === "stick") {{
-                    viewer.setStyle({{}}, {{stick: {{colorscheme: colorScheme}}}});
-                }} else if (styleType === "sphere") {{
-                    viewer.setStyle({{}}, {{sphere: {{colorscheme: colorScheme}}}});
-                }} else if (styleType === "surface") {{
-                    viewer.setStyle({{}}, {{surface: {{colorscheme: colorScheme, opacity: 0.8}}}});
-                }}
+    # Embed the PDB text as a JSON string literal; unlike a template literal it
+    # cannot be broken by backticks or ${...}, and "</" is escaped so the data
+    # can never close the surrounding <script> tag
+    pdb_json = json.dumps(pdb_data).replace("</", "<\\/")
+    
+    # Create HTML with 3Dmol.js
+    mutations_list = list(mutations)
+    
+    # Generate aggregation coloring if selected: one residue -> color map
+    # applied through a single colorfunc instead of a style call per residue
+    aggregation_coloring = ""
+    if color_scheme == "aggregation" and colors is not None:
+        color_json = json.dumps({i+1: color for i, color in enumerate(colors.tolist())}, separators=(",", ":"))
+        aggregation_coloring = (
+            f"let colorMap = {color_json};\n            "
+            "viewer.addStyle({}, {cartoon: {colorfunc: function(atom) { return colorMap[atom.resi] || '#ffffff'; }}});"
+        )
+    
+    viewer_html = f"""
+    <link rel="preload" as="script" href="{THREEDMOL_JS_URL}" crossorigin="anonymous">
+    <div id="container-01" style="height: 600px; width: 100%; position: relative;"></div>
+    
+    <script defer src="{THREEDMOL_JS_URL}" crossorigin="anonymous"></script>
+    <script>
+    // 3Dmol.js is deferred, so build the viewer once the document has parsed
+    document.addEventListener('DOMContentLoaded', function() {{
+        let element = document.getElementById('container-01');
+        let config = {{ backgroundColor: 'black' }};
+        let viewer = $3Dmol.createViewer(element, config);
+    
+        // PDB data
+        let pdbData = {pdb_json};
+    
+        // Add model
+        viewer.addModel(pdbData, "pdb");
+    
+        // Set style based on selection
+        let styleType = "{style}";
+        let colorScheme = "{color_scheme}";
+    
+        if (colorScheme === "aggregation") {{
+            // Apply AI aggregation coloring
+            viewer.setStyle({{}}, {{{style}: {{}}}});
+            {aggregation_coloring}
+        }} else {{
+            // Apply standard coloring
+            if (styleType === "cartoon") {{
+                viewer.setStyle({{}}, {{cartoon: {{colorscheme: colorScheme}}}});
+            }} else if (styleType === "stick") {{
+                viewer.setStyle({{}}, {{stick: {{colorscheme: colorScheme}}}});
+            }} else if (styleType === "sphere") {{
+                viewer.setStyle({{}}, {{sphere: {{colorscheme: colorScheme}}}});
+            }} else if (styleType === "surface") {{
+                viewer.setStyle({{}}, {{surface: {{colorscheme: colorScheme, opacity: 0.8}}}});
             }}
-            
-            // Highlight mutations
-            let mutations = {mutations_list};
-            let mutationInfo = {mutations_info};
-            
-            mutations.forEach(function(mutation) {{
-                let pos = mutationInfo[mutation].position;
-                viewer.addStyle({{resi: pos}}, {{sphere: {{color: 'red', radius: 2.0}}}});
-                viewer.addLabel(mutation, {{position: {{resi: pos}}, 
-                                         backgroundColor: 'red', 
-                                         fontColor: 'white',
-                                         fontSize: 12,
-                                         borderThickness: 1}});
-            }});
-            
-            // Final setup
-            viewer.zoomTo();
-            viewer.spin(true);
-            viewer.render();
-            </script>
-            """
-            
-            return viewer_html
-            
-        except Exception as e:
-            return f"""
-            <div style="height: 600px; width: 100%; display: flex; align-items: center; justify-content: center; border: 2px dashed #ccc;">
-                <div style="text-align: center;">
-                    <h3>Error loading structure</h3>
-                    <p>Could not fetch PDB data for {pdb_id}</p>
-                    <p>Error: {str(e)}</p>
-                    <p>Check your internet connection or try a different structure.</p>
-                </div>
+        }}
+    
+        // Highlight mutations
+        let mutations = {json.dumps(mutations_list)};
+        let mutationInfo = {json.dumps(mutations_info, separators=(",", ":"))};
+    
+        mutations.forEach(function(mutation) {{
+            let pos = mutationInfo[mutation].position;
+            viewer.addStyle({{resi: pos}}, {{sphere: {{color: 'red', radius: 2.0}}}});
+            viewer.addLabel(mutation, {{position: {{resi: pos}}, 
+                                     backgroundColor: 'red', 
+                                     fontColor: 'white',
+                                     fontSize: 12,
+                                     borderThickness: 1}});
+        }});
+    
+        // Final setup; rotation (if enabled) pauses while the tab is hidden
+        let autoRotate = {json.dumps(spin)};
+        viewer.zoomTo();
+        viewer.spin(autoRotate && !document.hidden);
+        document.addEventListener('visibilitychange', function() {{
+            viewer.spin(autoRotate && !document.hidden);
+        }});
+        viewer.render();
+    }});
+    </script>
+    """
+    
+    return viewer_html
+
+# Function to create 3D viewer
+def create_3d_viewer(pdb_id, style, color_scheme, mutations=None, colors=None, spin=False):
+    try:
+        # Sorted, so reordering the selection reuses the same cache entry
+        mutations_list = mutations if mutations and show_mutations else []
+        # Colors only matter for the aggregation scheme; keep them out of
+        # the cache key otherwise
+        if color_scheme != "aggregation":
+            colors = None
+        return render_viewer_html(pdb_id, style, color_scheme,
+                                  tuple(sorted(mutations_list)), colors, spin)
+        
+    except Exception as e:
+        return f"""
+        <div style="height: 600px; width: 100%; display: flex; align-items: center; justify-content: center; border: 2px dashed #ccc;">
+            <div style="text-align: center;">
+                <h3>Error loading structure</h3>
+                <p>Could not fetch PDB data for {pdb_id}</p>
+                <p>Error: {str(e)}</p>
+                <p>Check your internet connection or try a different structure.</p>
             </div>
-            """
+        </div>
+        """
+
+# The viewer is driven entirely by sidebar widgets, which always rerun the
+# whole script, so it is a plain function rather than a fragment
+def viewer_panel(selected_structure, pdb_id, style, color_scheme, mutations, colors, spin):
+    st.subheader(f"Structure: {selected_structure}")
     
-    # Generate and display the viewer
+    # Generate and display the viewer; the HTML is cached, so an unchanged
+    # viewer is sent to the browser as an identical element
     try:
-        mutations_to_highlight = selected_mutations if show_mutations and 'selected_mutations' in locals() else []
-        viewer_html = create_3d_viewer(pdb_id, style, color_scheme, mutations_to_highlight)
+        viewer_html = create_3d_viewer(pdb_id, style, color_scheme, mutations, colors, spin)
         components.html(viewer_html, height=650)
         
     except Exception as e:
         st.error(f"Error creating viewer: {e}")
         st.info("There was an issue creating the 3D viewer. Please check your internet connection.")
 
-with col2:
+# The analysis panel is a fragment: its own threshold slider reruns only
+# this panel, not the whole script
+@st.fragment
+def analysis_fragment(pdb_id, sequence, mutations, risk_scores):
     st.subheader("Protein Information")
     
     # Structure info
@@ -380,6 +638,17 @@ with col2:
     if show_aggregation:
         st.subheader("🤖 AI Aggregation Analysis")
         
+        # Only this panel depends on the threshold, so its slider lives in
+        # the fragment and moving it does not re-render the viewer
+        risk_threshold = st.slider(
+            "Risk threshold for highlighting:",
+            min_value=30, max_value=90, value=60, step=10
+        )
+        
+        high_risk_regions = cached_high_risk_regions(sequence, risk_threshold)
+        avg_risk = np.mean(risk_scores)
+        max_risk = max(risk_scores)
+        
         col_a, col_b = st.columns(2)
         with col_a:
             st.metric("Average Risk", f"{avg_risk:.1f}/100")
@@ -416,9 +685,9 @@ with col2:
             """)
     
     # Mutation information
-    if show_mutations and 'selected_mutations' in locals():
+    if show_mutations:
         st.subheader("🔴 Selected Mutations")
-        for mutation in selected_mutations:
+        for mutation in mutations:
             with st.expander(f"{mutation} (Position {mutations_info[mutation]['position']})"):
                 st.write(mutations_info[mutation]["description"])
                 st.write(f"**Position:** {mutations_info[mutation]['position']}")
@@ -445,6 +714,16 @@ with col2:
     - Contains three main regions: N-terminal, NAC, C-terminal
     """)
 
+# Create two columns for layout
+col1, col2 = st.columns([2, 1])
+
+with col1:
+    viewer_panel(selected_structure, pdb_id, style, color_scheme, selected_mutations,
+                 risk_colors, auto_rotate)
+
+with col2:
+    analysis_fragment(pdb_id, predictor.alpha_syn_sequence, selected_mutations, risk_scores)
+
 # Footer
 st.markdown("---")
 st.subheader("🚀 AI-Powered Features")
@@ -477,4 +756,17 @@ with col3:
     - 🌐 Web-based deployment
     """)
 
-st.info("💡 **Portfolio Highlight:** This project demonstrates AI/ML application to real biological problems - exactly what biotech companies are looking for!")
\ No newline at end of file
+st.info("💡 **Portfolio Highlight:** This project demonstrates AI/ML application to real biological problems - exactly what biotech companies are looking for!")
+
+# Cache diagnostics, only with ?debug=1; rendered last so this run's cache
+# entries are included
+if st.query_params.get("debug") == "1":
+    with st.sidebar.expander("⚙️ Cache stats"):
+        footprint = cache_memory_stats()
+        if footprint is None:
+            st.write("Cache stats unavailable in this Streamlit version.")
+        elif footprint:
+            for name, byte_length in sorted(footprint.items()):
+                st.metric(name, f"{byte_length / 1024:.1f} KB")
+        else:
+            st.write("No cached entries yet.")